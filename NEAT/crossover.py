@@ -1,7 +1,18 @@
-import random
-from copy import deepcopy
-
 from NEAT.genome import *
+from NEAT.genome import _rng
+
+
+def _copy_connection(cg: ConnectionGene) -> ConnectionGene:
+    """
+    Creates a copy of a connection gene.
+
+    Args:
+        cg (ConnectionGene): The connection gene to copy.
+
+    Returns:
+        ConnectionGene: A new connection gene with the same values.
+    """
+    return ConnectionGene(cg.id, cg.connection[0], cg.connection[1], cg.weight, cg.enabled)
 
 
 class Crossover:
@@ -33,23 +44,23 @@ class Crossover:
         if parent1.fitness < parent2.fitness:
             parent1, parent2 = parent2, parent1
         # assuming parent1.fitness >= parent2.fitness
-        child = deepcopy(parent1)
-        # reset connections in child
-        child.connections = {}
+        # the child starts with parent1's nodes, the connections are inherited below
+        child = parent1.empty_copy()
 
         # iterate over all connections in the fitter parent (parent1)
-        for conn_id in parent1.connections:
+        coin_flips = _rng.random(len(parent1.connections))
+        for conn_id, coin_flip in zip(parent1.connections, coin_flips):
             # if connection exists in both parents
             if conn_id in parent2.connections:
                 # randomly select which connection to inherit
-                if random.random() < 0.5:
-                    child.connections[conn_id] = deepcopy(parent1.connections[conn_id])
+                if coin_flip < 0.5:
+                    child.add_connection(_copy_connection(parent1.connections[conn_id]))
                 else:
-                    child.connections[conn_id] = deepcopy(parent2.connections[conn_id])
+                    child.add_connection(_copy_connection(parent2.connections[conn_id]))
 
             # if the connection exists only in the fitter parent (parent1)
             else:
-                child.connections[conn_id] = deepcopy(parent1.connections[conn_id])
+                child.add_connection(_copy_connection(parent1.connections[conn_id]))
 
         for conn_id in parent2.connections:
             # if the connection does not exist in the fitter parent (parent1)
@@ -57,10 +68,10 @@ class Crossover:
                 # only inherit this connection if the in_node is not an input node and the nodes exist in fitter parent (parent1)
                 if (
                     parent2.connections[conn_id].connection[0] >= 0
-                    and (conn_id[0] in parent1.nodes.keys())
-                    and (conn_id[1] in parent1.nodes.keys())
+                    and (conn_id[0] in parent1.nodes)
+                    and (conn_id[1] in parent1.nodes)
                 ):
-                    child.connections[conn_id] = deepcopy(parent2.connections[conn_id])
+                    child.add_connection(_copy_connection(parent2.connections[conn_id]))
 
         # make sure there are no connections that lead to an input node
         to_delete = []
@@ -69,6 +80,6 @@ class Crossover:
                 to_delete.append(conn)
 
         for i in to_delete:
-            del child.connections[i]
+            child.remove_connection(i)
 
         return child
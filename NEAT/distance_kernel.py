@@ -0,0 +1,152 @@
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:  # numba is optional, genetic_distance falls back to numpy
+    njit = None
+
+
+def _distance_core(ids1, w1, ids2, w2, act1, act2, nids1, nids2, c1, c2, c3):
+    """
+    Calculates the genetic distance of two genomes from their sorted gene arrays
+    (see Genome.connection_arrays() and Genome.node_arrays()). Both pairs of id arrays
+    are walked in a single merge step.
+
+    Args:
+        ids1, ids2 (np.ndarray): The sorted connection codes of the genomes.
+        w1, w2 (np.ndarray): The matching connection weights.
+        act1, act2 (np.ndarray): The activation codes of the nodes.
+        nids1, nids2 (np.ndarray): The matching sorted node ids.
+        c1 (float): Coefficient for the disjoint genes term.
+        c2 (float): Coefficient for the uncommon activations term.
+        c3 (float): Coefficient for the average weight difference term.
+
+    Returns:
+        float: The genetic distance, see NEAT.species.genetic_distance.
+    """
+    # common connections and their weight differences
+    i = 0
+    j = 0
+    n_common = 0
+    weight_diff = 0.0
+    while i < ids1.shape[0] and j < ids2.shape[0]:
+        if ids1[i] == ids2[j]:
+            weight_diff += abs(w1[i] - w2[j])
+            n_common += 1
+            i += 1
+            j += 1
+        elif ids1[i] < ids2[j]:
+            i += 1
+        else:
+            j += 1
+    n_disjoint = ids1.shape[0] + ids2.shape[0] - 2 * n_common
+
+    # common nodes and their differing activations
+    i = 0
+    j = 0
+    n_common_nodes = 0
+    uncommon_activations = 0
+    while i < nids1.shape[0] and j < nids2.shape[0]:
+        if nids1[i] == nids2[j]:
+            if act1[i] != act2[j]:
+                uncommon_activations += 1
+            n_common_nodes += 1
+            i += 1
+            j += 1
+        elif nids1[i] < nids2[j]:
+            i += 1
+        else:
+            j += 1
+
+    # normalizing factor for genome size
+    N = max(ids1.shape[0], ids2.shape[0])
+    N = N if N > 0 else 1
+
+    return (
+        (c1 * n_disjoint) / N
+        + c2 * uncommon_activations / n_common_nodes
+        + c3 * weight_diff / (n_common if n_common > 0 else 1)
+    )
+
+
+def _assign_species(
+    codes, weights, ptr, node_ids, activations, node_ptr,
+    rep_codes, rep_weights, rep_ptr, rep_node_ids, rep_activations, rep_node_ptr,
+    candidates, start, stop, threshold, c1, c2, c3, out,
+):
+    """
+    Finds a matching representative for each of the genomes start to stop-1 (see pack_genomes()).
+    A genome matches the first representative whose genetic distance is below the threshold.
+    The candidates of a genome are compared first, then all other representatives in order.
+
+    Args:
+        codes, weights, ptr, node_ids, activations, node_ptr (np.ndarray): The packed genomes.
+        rep_codes, rep_weights, rep_ptr, rep_node_ids, rep_activations, rep_node_ptr (np.ndarray):
+            The packed representatives.
+        candidates (np.ndarray): Indices of representatives to compare first, shape (n_genomes, k).
+        start (int): The first genome.
+        stop (int): The end of the genomes.
+        threshold (float): The distance threshold.
+        c1, c2, c3 (float): The coefficients of the genetic distance.
+        out (np.ndarray): Is set to the index of the matching representative of each genome, or -1.
+    """
+    n_reps = rep_ptr.shape[0] - 1
+    for g in range(start, stop):
+        a0, a1 = ptr[g], ptr[g + 1]
+        b0, b1 = node_ptr[g], node_ptr[g + 1]
+        out[g] = -1
+        for k in range(candidates.shape[1] + n_reps):
+            if k < candidates.shape[1]:
+                r = candidates[g, k]
+            else:
+                r = k - candidates.shape[1]
+                # candidates were compared already
+                if (candidates[g] == r).any():
+                    continue
+            distance = _distance_core(
+                codes[a0:a1], weights[a0:a1],
+                rep_codes[rep_ptr[r]:rep_ptr[r + 1]], rep_weights[rep_ptr[r]:rep_ptr[r + 1]],
+                activations[b0:b1], rep_activations[rep_node_ptr[r]:rep_node_ptr[r + 1]],
+                node_ids[b0:b1], rep_node_ids[rep_node_ptr[r]:rep_node_ptr[r + 1]],
+                c1, c2, c3,
+            )
+            if distance < threshold:
+                out[g] = r
+                break
+
+
+def pack_genomes(genomes: list):
+    """
+    Concatenates the sorted gene arrays of the genomes (see Genome.connection_arrays() and
+    Genome.node_arrays()). The genes of the n-th genome are codes[ptr[n]:ptr[n + 1]] and
+    node_ids[node_ptr[n]:node_ptr[n + 1]] with the matching weights and activations.
+
+    Args:
+        genomes (list): The genomes.
+
+    Returns:
+        tuple: (codes, weights, ptr, node_ids, activations, node_ptr) arrays.
+    """
+    connections = [genome.connection_arrays() for genome in genomes]
+    nodes = [genome.node_arrays() for genome in genomes]
+    ptr = np.zeros(len(genomes) + 1, dtype=np.int64)
+    np.cumsum([len(c) for c, _ in connections], out=ptr[1:])
+    node_ptr = np.zeros(len(genomes) + 1, dtype=np.int64)
+    np.cumsum([len(n) for n, _ in nodes], out=node_ptr[1:])
+    return (
+        np.concatenate([c for c, _ in connections] + [np.empty(0, dtype=np.int64)]),
+        np.concatenate([w for _, w in connections] + [np.empty(0, dtype=np.float64)]),
+        ptr,
+        np.concatenate([n for n, _ in nodes] + [np.empty(0, dtype=np.int64)]),
+        np.concatenate([a for _, a in nodes] + [np.empty(0, dtype=np.int64)]),
+        node_ptr,
+    )
+
+
+# the compiled kernels, None if numba is not installed. They release the GIL, so they can run in threads.
+if njit is not None:
+    _distance_core = njit(cache=True, nogil=True)(_distance_core)
+    distance_core = _distance_core
+    assign_species = njit(cache=True, nogil=True)(_assign_species)
+else:
+    distance_core = assign_species = None
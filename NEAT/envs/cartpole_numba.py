@@ -0,0 +1,128 @@
+####################################################################################################################
+# NOTE
+# A reimplementation of the gymnasium "CartPole-v1" environment, which runs the whole episode without gymnasium.
+# The dynamics follow gymnasium.envs.classic_control.cartpole (euler integration, reward 1.0 per step).
+# If numba is installed, the episodes and the network activation are compiled into a single loop.
+####################################################################################################################
+import math
+
+import numpy as np
+
+from NEAT.ffnn import FeedForwardNetwork, _activate_flat
+from NEAT.genome import _rng
+
+try:
+    from numba import njit
+except ImportError:  # numba is optional, rollout() falls back to a python loop
+    njit = None
+
+GRAVITY = 9.8
+MASSCART = 1.0
+MASSPOLE = 0.1
+TOTAL_MASS = MASSPOLE + MASSCART
+LENGTH = 0.5  # actually half the pole's length
+POLEMASS_LENGTH = MASSPOLE * LENGTH
+FORCE_MAG = 10.0
+TAU = 0.02  # seconds between state updates
+THETA_THRESHOLD = 12 * 2 * math.pi / 360  # angle at which to fail the episode
+X_THRESHOLD = 2.4
+MAX_STEPS = 500  # time limit of CartPole-v1
+
+
+def _step(x, x_dot, theta, theta_dot, action):
+    """
+    Advances the cart pole by one time step.
+
+    Returns:
+        tuple: The new (x, x_dot, theta, theta_dot) and whether the episode terminated.
+    """
+    force = FORCE_MAG if action == 1 else -FORCE_MAG
+    costheta = math.cos(theta)
+    sintheta = math.sin(theta)
+
+    temp = (force + POLEMASS_LENGTH * theta_dot * theta_dot * sintheta) / TOTAL_MASS
+    thetaacc = (GRAVITY * sintheta - costheta * temp) / (
+        LENGTH * (4.0 / 3.0 - MASSPOLE * costheta * costheta / TOTAL_MASS)
+    )
+    xacc = temp - POLEMASS_LENGTH * thetaacc * costheta / TOTAL_MASS
+
+    x = x + TAU * x_dot
+    x_dot = x_dot + TAU * xacc
+    theta = theta + TAU * theta_dot
+    theta_dot = theta_dot + TAU * thetaacc
+
+    terminated = (
+        x < -X_THRESHOLD
+        or x > X_THRESHOLD
+        or theta < -THETA_THRESHOLD
+        or theta > THETA_THRESHOLD
+    )
+    return x, x_dot, theta, theta_dot, terminated
+
+
+def _rollout(values, initial_states, output_slots, ptr, src, weights, biases, codes, max_steps):
+    total_reward = 0.0
+    observation = np.empty(4, dtype=np.float32)
+    for e in range(initial_states.shape[0]):
+        x, x_dot, theta, theta_dot = initial_states[e]
+        for _ in range(max_steps):
+            observation[0] = x
+            observation[1] = x_dot
+            observation[2] = theta
+            observation[3] = theta_dot
+            outputs = _activate_flat(
+                values, observation, output_slots, ptr, src, weights, biases, codes
+            )
+            x, x_dot, theta, theta_dot, terminated = _step(
+                x, x_dot, theta, theta_dot, np.argmax(outputs)
+            )
+            total_reward += 1.0
+            if terminated:
+                break
+    return total_reward / initial_states.shape[0]
+
+
+if njit is not None:
+    _step = njit(cache=True)(_step)
+    _rollout = njit(cache=True)(_rollout)
+
+
+def rollout(network: FeedForwardNetwork, n_episodes: int = 5, max_steps: int = MAX_STEPS):
+    """
+    Runs CartPole episodes with the network choosing the action with the highest output.
+
+    Args:
+        network (FeedForwardNetwork): The network with 4 inputs and 2 outputs.
+        n_episodes (int, optional): The number of episodes. Defaults to 5.
+        max_steps (int, optional): The number of steps after which an episode is truncated. Defaults to 500.
+
+    Returns:
+        float: The mean reward of the episodes.
+    """
+    # same initial states as gymnasium's reset()
+    initial_states = _rng.uniform(-0.05, 0.05, size=(n_episodes, 4))
+
+    if njit is not None:
+        return _rollout(
+            network.values,
+            initial_states,
+            network.output_slots,
+            network._ptr,
+            network._src,
+            network._w,
+            network._b,
+            network._codes,
+            max_steps,
+        )
+
+    total_reward = 0.0
+    for x, x_dot, theta, theta_dot in initial_states.tolist():
+        for _ in range(max_steps):
+            outputs = network.activate([x, x_dot, theta, theta_dot])
+            x, x_dot, theta, theta_dot, terminated = _step(
+                x, x_dot, theta, theta_dot, outputs.index(max(outputs))
+            )
+            total_reward += 1.0
+            if terminated:
+                break
+    return total_reward / n_episodes
@@ -5,8 +5,20 @@
 # At the end of this file, the activation functions are defined.
 ####################################################################################################################
 import math
+from collections import defaultdict
 
-from NEAT.genome import Genome
+import numpy as np
+
+from NEAT.genome import ACT_RELU, ACT_SIGMOID, Genome
+
+try:
+    from numba import njit, vectorize
+except ImportError:  # numba is optional, activate() falls back to numpy
+    njit = vectorize = None
+
+# without numba, networks with more weights per layer than this on average are activated with
+# one matrix-vector product per layer instead of a generated function
+DENSE_LAYER_WEIGHTS = 200
 
 
 class FeedForwardNetwork(object):
@@ -14,13 +26,40 @@ class FeedForwardNetwork(object):
     A class for creating a feed-forward neural network.
     Use FeedForwardNetwork.create(genome) to create a network from a genome.
     The network is activated with the activate() method, which takes a list as input.
+
+    The node values are kept in a numpy array. Input nodes come first, followed by the
+    nodes of each layer, so every layer only reads from the values in front of it and
+    can be evaluated with a single matrix-vector product.
+    If numba is installed, the layers are additionally flattened into sparse float32 arrays
+    which are evaluated by a compiled kernel. Otherwise, activate() uses a Python function
+    generated for the network on the first call (see compile_layers()), or for large layers
+    the matrix-vector products (see DENSE_LAYER_WEIGHTS).
     """
 
-    def __init__(self, inputs: list, outputs: list, node_evals: list):
+    def __init__(self, inputs: list, outputs: list, layers: list, node_index: dict):
+        """
+        Args:
+            inputs (list): The input node identifiers.
+            outputs (list): The output node identifiers.
+            layers (list): A list of (offset, weights, biases, codes) tuples, one per layer.
+              The weights of shape (n_layer_nodes, offset) are applied to the first `offset` values.
+            node_index (dict): Maps every node identifier to its position in the values array.
+        """
         self.input_nodes = inputs
         self.output_nodes = outputs
-        self.node_evals = node_evals
-        self.values = dict((key, 0.0) for key in inputs + outputs)
+        self.layers = layers
+        self.node_index = node_index
+        # node values, reused for every activation. Unreachable outputs stay at 0.0.
+        self.values = np.zeros(len(node_index), dtype=np.float32)
+        self.input_slots = np.array([node_index[i] for i in inputs], dtype=np.intp)
+        self.output_slots = np.array([node_index[o] for o in outputs], dtype=np.intp)
+        # networks with the same key have the same value layout and layer shapes
+        self.topology_key = (tuple(node_index), tuple(len(b) for _, _, b, _ in layers))
+        if njit is not None:
+            self._ptr, self._src, self._w, self._b, self._codes = (
+                FeedForwardNetwork.flatten_layers(layers)
+            )
+        self._fn = None  # generated activation function, see compile_layers()
 
     def activate(self, inputs: list):
         """
@@ -42,17 +81,195 @@ class FeedForwardNetwork(object):
                 )
             )
 
-        for k, v in zip(self.input_nodes, inputs):
-            self.values[k] = v
+        if njit is not None:
+            return _activate_flat(
+                self.values,
+                np.asarray(inputs, dtype=np.float32),
+                self.output_slots,
+                self._ptr,
+                self._src,
+                self._w,
+                self._b,
+                self._codes,
+            ).tolist()
+
+        if self._fn is None:
+            n_weights = sum(np.count_nonzero(w) for _, w, _, _ in self.layers)
+            if n_weights > DENSE_LAYER_WEIGHTS * len(self.layers):
+                self._fn = self._activate_layers
+            else:
+                self._fn = FeedForwardNetwork.compile_layers(
+                    self.layers, len(self.input_nodes), self.output_slots
+                )
+        # python floats are considerably faster than numpy scalars in the generated code
+        if isinstance(inputs, np.ndarray):
+            inputs = inputs.tolist()
+        return self._fn(inputs)
+
+    def _activate_layers(self, inputs: list):
+        """
+        Activate the network layer by layer with a matrix-vector product per layer.
+
+        Args:
+            inputs (list): The inputs to the network.
+
+        Returns:
+            list: The outputs of the network.
+        """
+        values = self.values
+        values[: len(inputs)] = inputs
+        for offset, weights, biases, codes in self.layers:
+            z = weights @ values[:offset]
+            z += biases
+            values[offset : offset + len(biases)] = activate_layer(z, codes)
+        return values[self.output_slots].tolist()
+
+    @staticmethod
+    def activate_batch(population: list, inputs_batch):
+        """
+        Activate the networks of a whole population on a batch of inputs.
+
+        The networks are grouped by topology. Within a group, the layer weights are stacked to
+        arrays of shape (P, n_layer_nodes, offset), so each layer of the group is evaluated with
+        a single einsum over all genomes and inputs. A genome with a unique topology forms a group
+        of its own.
+
+        Args:
+            population (list): The genomes to create and activate the networks from.
+            inputs_batch (array-like): The inputs, either of shape (B, n_inputs) shared by all genomes
+              or of shape (P, B, n_inputs) with a separate batch per genome.
+
+        Raises:
+            RuntimeError: In case the number of inputs does not match the number of input nodes.
+
+        Returns:
+            list: One array of shape (B, n_outputs) per genome, in the order of the population.
+        """
+        networks = [FeedForwardNetwork.create(genome) for genome in population]
+        inputs = np.asarray(inputs_batch, dtype=np.float32)
+        if inputs.ndim == 2:
+            inputs = np.broadcast_to(inputs, (len(networks),) + inputs.shape)
+
+        groups = {}
+        for p, network in enumerate(networks):
+            if len(network.input_nodes) != inputs.shape[-1]:
+                raise RuntimeError(
+                    "Expected {0:n} inputs, got {1:n}".format(
+                        len(network.input_nodes), inputs.shape[-1]
+                    )
+                )
+            groups.setdefault(network.topology_key, []).append(p)
+
+        outputs = [None] * len(networks)
+        for members in groups.values():
+            group = [networks[p] for p in members]
+            first = group[0]
+            values = np.zeros(
+                (len(group), inputs.shape[1], len(first.values)), dtype=np.float32
+            )
+            values[:, :, first.input_slots] = inputs[members]
+
+            for l, (offset, _, _, _) in enumerate(first.layers):
+                weights = np.stack([network.layers[l][1] for network in group])
+                biases = np.stack([network.layers[l][2] for network in group])
+                codes = np.stack([network.layers[l][3] for network in group])
+                z = np.einsum("poi,pbi->pbo", weights, values[:, :, :offset])
+                z += biases[:, None, :]
+                values[:, :, offset : offset + weights.shape[1]] = activate_layer(
+                    z, codes[:, None, :]
+                )
+
+            for p, out in zip(members, values[:, :, first.output_slots]):
+                outputs[p] = out
+
+        return outputs
+
+    @staticmethod
+    def compile_layers(layers: list, n_inputs: int, output_slots):
+        """
+        Generate a Python function that evaluates the network with the weights and biases
+        written into its source code. The node values are held in local variables named by
+        their position in the values array.
+
+        Example of the generated source for two inputs, one hidden and one output node:
+            def _activate(inputs, exp=math.exp):
+                v0, v1 = inputs
+                z = 0.12 + v0 * 0.5 + v1 * -0.3
+                v2 = 1.0 / (1.0 + exp(max(-100.0, min(100.0, -5.0 * z))))
+                z = -0.1 + v2 * 0.9
+                v3 = 1.0 / (1.0 + exp(max(-100.0, min(100.0, -5.0 * z))))
+                return [v3]
+
+        Args:
+            layers (list): The (offset, weights, biases, codes) tuples of the network.
+            n_inputs (int): The number of input nodes, which take the first positions.
+            output_slots (array-like): The positions of the output nodes in the values array.
+
+        Returns:
+            callable: A function taking a list of inputs and returning the list of outputs.
+        """
+        lines = ["def _activate(inputs, exp=math.exp):"]
+        if n_inputs > 0:
+            lines.append(
+                "    " + "".join("v%d, " % i for i in range(n_inputs)) + "= inputs"
+            )
+
+        evaluated = set(range(n_inputs))
+        for offset, weights, biases, codes in layers:
+            for row in range(len(biases)):
+                terms = [repr(float(biases[row]))]
+                for col in np.flatnonzero(weights[row]):
+                    terms.append("v%d * %r" % (col, float(weights[row, col])))
+                lines.append("    z = " + " + ".join(terms))
+                if codes[row] == ACT_SIGMOID:
+                    value = "1.0 / (1.0 + exp(max(-100.0, min(100.0, -5.0 * z))))"
+                else:
+                    value = "max(0.0, min(100.0, z))"
+                lines.append("    v%d = %s" % (offset + row, value))
+                evaluated.add(offset + row)
+
+        # outputs that are not reachable from the inputs are always 0.0
+        outputs = ["v%d" % o if o in evaluated else "0.0" for o in output_slots]
+        lines.append("    return [" + ", ".join(outputs) + "]")
+
+        namespace = {"math": math}
+        exec("\n".join(lines), namespace)
+        return namespace["_activate"]
 
-        for node, act_func, bias, links in self.node_evals:
-            node_inputs = []
-            for i, w in links:
-                node_inputs.append(self.values[i] * w)
-            s = sum(node_inputs)
-            self.values[node] = activation_functions[act_func](bias + s)
+    @staticmethod
+    def flatten_layers(layers: list):
+        """
+        Flatten the dense layer matrices into a sparse row representation (see activate()).
+        The evaluated nodes are numbered in the order of the values array, right after the inputs.
 
-        return [self.values[i] for i in self.output_nodes]
+        Args:
+            layers (list): The (offset, weights, biases, codes) tuples of the network.
+
+        Returns:
+            tuple: (ptr, src, weights, biases, codes) arrays. The incoming links of the n-th evaluated
+              node are src[ptr[n]:ptr[n + 1]] with the matching weights.
+        """
+        ptr = [0]
+        src = []
+        weights = []
+        biases = []
+        codes = []
+        for _, layer_weights, layer_biases, layer_codes in layers:
+            for row in range(len(layer_biases)):
+                cols = np.flatnonzero(layer_weights[row])
+                src.extend(cols)
+                weights.extend(layer_weights[row, cols])
+                ptr.append(len(src))
+            biases.extend(layer_biases)
+            codes.extend(layer_codes)
+
+        return (
+            np.array(ptr, dtype=np.int64),
+            np.array(src, dtype=np.int64),
+            np.array(weights, dtype=np.float32),
+            np.array(biases, dtype=np.float32),
+            np.array(codes, dtype=np.int8),
+        )
 
     @staticmethod
     def required_for_output(inputs: list, outputs: list, connections: list):
@@ -73,21 +290,21 @@ class FeedForwardNetwork(object):
         """
         assert not set(inputs).intersection(outputs)
 
-        required = set(outputs)
-        s = set(outputs)
-        while 1:
-            # Find nodes not in s whose output is consumed by a node in s.
-            t = set(a for (a, b) in connections if b in s and a not in s)
-
-            if not t:
-                break
-
-            layer_nodes = set(x for x in t if x not in inputs)
-            if not layer_nodes:
-                break
+        inputs = set(inputs)
+        # inputs of each node
+        sources = defaultdict(list)
+        for a, b in connections:
+            sources[b].append(a)
 
-            required = required.union(layer_nodes)
-            s = s.union(t)
+        # walk backwards from the outputs, stopping at the input nodes
+        required = set(outputs)
+        stack = list(required)
+        while stack:
+            node = stack.pop()
+            for a in sources[node]:
+                if a not in inputs and a not in required:
+                    required.add(a)
+                    stack.append(a)
 
         return required
 
@@ -108,23 +325,32 @@ class FeedForwardNetwork(object):
         """
         required = FeedForwardNetwork.required_for_output(inputs, outputs, connections)
 
+        # count the inputs of each node that are not evaluated yet
+        targets = defaultdict(list)
+        remaining = defaultdict(int)
+        for a, b in connections:
+            targets[a].append(b)
+            remaining[b] += 1
+
         layers = []
         s = set(inputs)
+        t = s
         while 1:
-            # Find candidate nodes c for the next layer. These nodes should connect
-            # a node in s to a node not in s.
-            c = set(b for (a, b) in connections if a in s and b not in s)
-            # Keep only the used nodes whose entire input set is contained in s.
-            t = set()
-            for n in c:
-                if n in required and all(a in s for (a, b) in connections if b == n):
-                    t.add(n)
-
-            if not t:
+            # Nodes whose entire input set is contained in s form the next layer,
+            # keep only the used ones.
+            next_layer = set()
+            for a in t:
+                for b in targets[a]:
+                    remaining[b] -= 1
+                    if remaining[b] == 0 and b in required and b not in s:
+                        next_layer.add(b)
+
+            if not next_layer:
                 break
 
-            layers.append(t)
-            s = s.union(t)
+            layers.append(next_layer)
+            s = s.union(next_layer)
+            t = next_layer
 
         return layers
 
@@ -139,29 +365,49 @@ class FeedForwardNetwork(object):
         Returns:
             FeedForwardNetwork: The genomes feed-forward network.
         """
-        # Gather expressed connections
-        connections = [
-            cg.connection for cg in genome.connections.values() if cg.enabled
-        ]
+        # Gather expressed connections, grouped by their output node
+        connections = []
+        by_target = defaultdict(list)
+        for cg in genome.connections.values():
+            if cg.enabled:
+                connections.append(cg.connection)
+                by_target[cg.connection[1]].append((cg.connection[0], cg.weight))
 
         layers = FeedForwardNetwork.feed_forward_layers(
             genome.input_node_ids, genome.output_node_ids, connections
         )
-        node_evals = []
+        # input nodes are placed in front of the values array
+        node_index = {}
+        for i in genome.input_node_ids:
+            node_index[i] = len(node_index)
+
+        layer_evals = []
         for layer in layers:
-            for node in layer:
-                inputs = []
-                for conn_key in connections:
-                    inode, onode = conn_key
-                    if onode == node:
-                        cg = genome.connections[conn_key]
-                        inputs.append((inode, cg.weight))
+            layer = sorted(layer)
+            offset = len(node_index)
+            weights = np.zeros((len(layer), offset), dtype=np.float32)
+            biases = np.empty(len(layer), dtype=np.float32)
+            codes = np.empty(len(layer), dtype=np.int8)
+            for row, node in enumerate(layer):
+                for inode, weight in by_target[node]:
+                    weights[row, node_index[inode]] = weight
 
                 ng = genome.nodes[node]
-                node_evals.append((node, ng.activation, ng.bias, inputs))
+                biases[row] = ng.bias
+                codes[row] = ng.activation
+
+            # nodes of a layer only depend on previous layers, so they are indexed afterwards
+            for node in layer:
+                node_index[node] = len(node_index)
+            layer_evals.append((offset, weights, biases, codes))
+
+        # outputs that are not reachable from the inputs keep a value of 0.0
+        for o in genome.output_node_ids:
+            if o not in node_index:
+                node_index[o] = len(node_index)
 
         return FeedForwardNetwork(
-            genome.input_node_ids, genome.output_node_ids, node_evals
+            genome.input_node_ids, genome.output_node_ids, layer_evals, node_index
         )
 
 
@@ -170,17 +416,89 @@ class FeedForwardNetwork(object):
 # Add any further activation functions here.
 ##########################################################################
 
+# activation functions by their code (see NEAT.genome), the networks dispatch on the code
 activation_functions = {
-    "sigmoid": lambda x: sigmoid_activation(x),
-    "relu": lambda x: relu_activation,
+    ACT_SIGMOID: lambda x: sigmoid_activation(x),
+    ACT_RELU: lambda x: relu_activation(x),
 }
 
 
 def sigmoid_activation(z):
-    z = max(-100.0, min(100.0, 5.0 * z))  # clamping
-    return 1.0 / (1.0 + math.exp(-z))
+    z = np.clip(5.0 * z, -100.0, 100.0)  # clamping
+    with np.errstate(over="ignore"):  # exp overflows to inf for float32, giving 0.0
+        return 1.0 / (1.0 + np.exp(-z))
 
 
 def relu_activation(z):
-    z = max(-100.0, min(100.0, z))  # clamping
-    return max(0, z)
+    z = np.clip(z, -100.0, 100.0)  # clamping
+    return np.maximum(0.0, z)
+
+
+if vectorize is not None:
+    # compiled ufuncs doing the clamping and activation in a single pass, they accept scalars as well
+
+    @vectorize(["float32(float32)", "float64(float64)"], fastmath=True, cache=True)
+    def sigmoid_activation(z):
+        z = max(-100.0, min(100.0, 5.0 * z))  # clamping
+        return 1.0 / (1.0 + math.exp(-z))
+
+    @vectorize(["float32(float32)", "float64(float64)"], fastmath=True, cache=True)
+    def relu_activation(z):
+        z = max(-100.0, min(100.0, z))  # clamping
+        return max(0.0, z)
+
+
+def activate_layer(z: np.ndarray, codes: np.ndarray):
+    """
+    Applies the activation functions of a layer to the array z.
+    If all nodes use the sigmoid activation, z is overwritten with the result.
+
+    Args:
+        z (np.ndarray): The weighted inputs plus biases of the layer nodes.
+        codes (np.ndarray): The activation codes of the layer nodes, broadcastable to z.
+
+    Returns:
+        np.ndarray: The activated values.
+    """
+    sigmoid = codes == ACT_SIGMOID
+    if not sigmoid.all():
+        return np.where(sigmoid, sigmoid_activation(z), relu_activation(z))
+    if vectorize is not None:
+        return sigmoid_activation(z, out=z)
+
+    z *= -5.0
+    np.clip(z, -100.0, 100.0, out=z)  # clamping
+    with np.errstate(over="ignore"):  # exp overflows to inf for float32, giving 0.0
+        np.exp(z, out=z)
+    z += 1.0
+    return np.reciprocal(z, out=z)
+
+
+##########################################################################
+# Compiled activation, only used if numba is installed.
+##########################################################################
+
+
+def _activate_flat(values, inputs, output_slots, ptr, src, weights, biases, codes):
+    n_inputs = inputs.shape[0]
+    values[:n_inputs] = inputs
+
+    for n in range(biases.shape[0]):
+        z = biases[n]
+        for j in range(ptr[n], ptr[n + 1]):
+            z += values[src[j]] * weights[j]
+        if codes[n] == ACT_SIGMOID:
+            z = max(-100.0, min(100.0, 5.0 * z))  # clamping
+            values[n_inputs + n] = 1.0 / (1.0 + math.exp(-z))
+        else:
+            z = max(-100.0, min(100.0, z))  # clamping
+            values[n_inputs + n] = max(0.0, z)
+
+    outputs = np.empty(output_slots.shape[0], dtype=np.float32)
+    for k in range(output_slots.shape[0]):
+        outputs[k] = values[output_slots[k]]
+    return outputs
+
+
+if njit is not None:
+    _activate_flat = njit(cache=True, fastmath=True, boundscheck=False)(_activate_flat)
@@ -1,6 +1,45 @@
+import os
 import random
+from collections import defaultdict
 from enum import Enum, auto
 
+import numpy as np
+
+# random generator for batched draws, scalar draws use the faster random module
+_rng = np.random.default_rng()
+
+
+def _reseed_rng():
+    """
+    Reseeds the generator, so forked worker processes do not repeat the parent's numbers.
+    The random module does the same for itself.
+    """
+    _rng.bit_generator.state = np.random.default_rng().bit_generator.state
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reseed_rng)
+
+
+def seed(a=None):
+    """
+    Seeds the random module and the generator used for the batched draws. Runs started after
+    seeding with the same value are reproducible if the fitness function is deterministic.
+    random.seed() alone does not seed the generator.
+
+    Note:
+        With NEAT(parallel=True), the offspring are created in worker processes, so a parallel
+        run is not reproducible.
+
+    Args:
+        a (int, optional): The seed. If None, a fresh seed is taken from the operating system.
+    """
+    random.seed(a)
+    _rng.bit_generator.state = np.random.default_rng(a).bit_generator.state
+
+# offset to pack a connection (in_node, out_node) into a single non-negative integer code
+_NODE_ID_OFFSET = 2**30
+
 
 class NodeType(Enum):
     """
@@ -12,6 +51,16 @@ class NodeType(Enum):
     HIDDEN = auto()
 
 
+# integer codes of the activation functions, see FeedForwardNetwork in NEAT.ffnn
+ACT_SIGMOID = 0
+ACT_RELU = 1
+
+activation_codes = {
+    "sigmoid": ACT_SIGMOID,
+    "relu": ACT_RELU,
+}
+
+
 class NodeGene:
     """
     Represents a node in a neural network genome for NEAT.
@@ -20,14 +69,22 @@ class NodeGene:
         id (int): A unique identifier for the node.
         type (str): The type of the node (e.g., 'input', 'hidden', 'output').
         bias (float): The bias value associated with the node.
-        activation (str): The activation function used by the node.
+        activation (int): The code of the activation function used by the node (e.g. ACT_SIGMOID).
     """
 
-    def __init__(self, id: int, type: NodeType, bias: float, activation: str):
+    __slots__ = ("id", "type", "bias", "activation")
+
+    def __init__(self, id: int, type: NodeType, bias: float, activation: str | int):
         self.id = id
         self.type = type
         self.bias = bias
-        self.activation = activation
+        # activation names (e.g. 'sigmoid') are stored as their integer code
+        self.activation = (
+            activation_codes[activation] if isinstance(activation, str) else activation
+        )
+
+    def __reduce__(self):
+        return (NodeGene, (self.id, self.type, self.bias, self.activation))
 
     def __str__(self):
         return (
@@ -55,6 +112,8 @@ class ConnectionGene:
         enabled (bool): A flag indicating whether the connection is enabled or disabled.
     """
 
+    __slots__ = ("id", "connection", "weight", "enabled")
+
     def __init__(
         self, id: int, in_node: int, out_node: int, weight: float, enabled: bool
     ):
@@ -63,6 +122,12 @@ class ConnectionGene:
         self.weight = weight
         self.enabled = enabled
 
+    def __reduce__(self):
+        return (
+            ConnectionGene,
+            (self.id, self.connection[0], self.connection[1], self.weight, self.enabled),
+        )
+
     def __str__(self):
         return (
             'IN: ' + str(self.connection[0]) + '\n' +
@@ -82,10 +147,13 @@ class Genome:
     Attributes:
         nodes (dict): A dictionary of NodeGene objects, where keys are node IDs.
         connections (dict): A dictionary of ConnectionGene objects, where keys are tuples of (input_node_id, output_node_id).
+        connections_list (list): The ConnectionGene objects of `connections` as a list, kept in sync by
+            add_connection() and remove_connection().
         input_node_ids (list): A list of IDs for input nodes. Negative by default.
         output_node_ids (list): A list of IDs for output nodes. 0 to n by default.
         fitness (float): The fitness score of the genome.
         adjusted_fitness (float): The adjusted fitness score of the genome.
+        dirty (bool): Whether the genome was created or changed since its fitness was last calculated.
     """
 
     def __init__(self, n_inputs: int, n_outputs: int, initial_connections: int = -1):
@@ -100,25 +168,29 @@ class Genome:
         """
         self.nodes = {}  # dictionary of NodeGene objects
         self.connections = {}  # dictionary of ConnectionGene objects
+        self.connections_list = []  # list of the same ConnectionGene objects
         self.input_node_ids = []
         self.output_node_ids = []
         self.fitness = 0.0
         self.adjusted_fitness = 0.0
+        self.dirty = True
+        self._connection_arrays = None  # see connection_arrays()
+        self._node_arrays = None  # see node_arrays()
+        self._node_keys = None  # see node_keys
 
+        biases = _rng.uniform(-1, 1, size=n_inputs + n_outputs).tolist()
         for i in range(n_inputs):
             # apply negative id for input nodes
             id = -(i + 1)
-            self.nodes[id] = NodeGene(
-                id, NodeType.SENSOR, random.uniform(-1, 1), "sigmoid"
-            )
+            self.nodes[id] = NodeGene(id, NodeType.SENSOR, biases[i], "sigmoid")
             self.input_node_ids.append(id)
 
         for o in range(n_outputs):
             # apply positive ids from 0 to n for output nodes
-            self.nodes[o] = NodeGene(
-                o, NodeType.OUTPUT, random.uniform(-1, 1), "sigmoid"
-            )
+            self.nodes[o] = NodeGene(o, NodeType.OUTPUT, biases[n_inputs + o], "sigmoid")
             self.output_node_ids.append(o)
+        # hidden nodes get ids after the output nodes
+        self._next_node_id = max(self.output_node_ids) + 1 if self.output_node_ids else 0
 
         # set initial connections to max if not specified
         initial_connections = (
@@ -129,36 +201,175 @@ class Genome:
         for in_node in self.input_node_ids:
             for out_node in self.output_node_ids:
                 possible_connections.append((in_node, out_node))
-                
-        for i in range(min(initial_connections, n_inputs * n_outputs)):
-            # add new random connections
-            connection_id = random.choice(possible_connections)
-            possible_connections.remove(connection_id)
-            self.connections[connection_id] = ConnectionGene(
-                connection_id,
-                connection_id[0],
-                connection_id[1],
-                random.uniform(-1, 1),
-                True,
+
+        # add new random connections
+        chosen = random.sample(
+            possible_connections, min(initial_connections, len(possible_connections))
+        )
+        weights = _rng.uniform(-1, 1, size=len(chosen)).tolist()
+        for connection_id, weight in zip(chosen, weights):
+            self.add_connection(
+                ConnectionGene(
+                    connection_id, connection_id[0], connection_id[1], weight, True
+                )
+            )
+
+    def empty_copy(self):
+        """
+        Creates a genome with copies of the nodes of this genome but without any connections.
+        The fitness values are carried over.
+
+        Returns:
+            Genome: The new genome.
+        """
+        genome = Genome.__new__(Genome)
+        genome.nodes = {
+            k: NodeGene(n.id, n.type, n.bias, n.activation) for k, n in self.nodes.items()
+        }
+        genome.connections = {}
+        genome.connections_list = []
+        genome.input_node_ids = list(self.input_node_ids)
+        genome.output_node_ids = list(self.output_node_ids)
+        genome._next_node_id = self._next_node_id
+        genome.fitness = self.fitness
+        genome.adjusted_fitness = self.adjusted_fitness
+        genome.dirty = True
+        genome._connection_arrays = None
+        genome._node_arrays = None
+        genome._node_keys = None
+        return genome
+
+    def __getstate__(self):
+        # cached arrays are rebuilt on demand, there is no need to send them to other processes
+        state = self.__dict__.copy()
+        state["_connection_arrays"] = None
+        state["_node_arrays"] = None
+        state["_node_keys"] = None
+        return state
+
+    def invalidate(self):
+        """
+        Marks the genome as changed. Its fitness has to be calculated again and cached data
+        is rebuilt on the next use. Call this after changing genes directly.
+        """
+        self.dirty = True
+        self._connection_arrays = None
+        self._node_arrays = None
+        self._node_keys = None
+
+    @property
+    def node_keys(self):
+        """
+        The identifiers of the nodes of the genome, cached until the nodes change.
+
+        Returns:
+            frozenset: The node IDs.
+        """
+        if self._node_keys is None:
+            self._node_keys = frozenset(self.nodes)
+        return self._node_keys
+
+    def connection_arrays(self):
+        """
+        Returns the connections of the genome as sorted numpy arrays. Each connection
+        (in_node, out_node) is packed into a single integer code, which keeps the order of the tuples.
+        The arrays are cached until the genome is changed.
+
+        Returns:
+            tuple: (codes, weights), the int64 codes in ascending order and the matching weights.
+        """
+        if self._connection_arrays is None:
+            keys = sorted(self.connections)
+            pairs = np.array(keys, dtype=np.int64).reshape(-1, 2) + _NODE_ID_OFFSET
+            codes = (pairs[:, 0] << 31) | pairs[:, 1]
+            weights = np.array([self.connections[k].weight for k in keys], dtype=np.float64)
+            self._connection_arrays = (codes, weights)
+        return self._connection_arrays
+
+    def node_arrays(self):
+        """
+        Returns the nodes of the genome as sorted numpy arrays.
+        The arrays are cached until the genome is changed.
+
+        Returns:
+            tuple: (ids, activations), the int64 node ids in ascending order and the matching activation codes.
+        """
+        if self._node_arrays is None:
+            ids = sorted(self.nodes)
+            activations = [self.nodes[k].activation for k in ids]
+            self._node_arrays = (
+                np.array(ids, dtype=np.int64),
+                np.array(activations, dtype=np.int64),
             )
+        return self._node_arrays
+
+    def structural_key(self):
+        """
+        Creates a hashable key of the genome. Genomes with the same key build the same network.
+
+        Returns:
+            tuple: The connections as (id, weight, enabled) and the nodes as (id, bias, activation).
+        """
+        return (
+            frozenset((k, c.weight, c.enabled) for k, c in self.connections.items()),
+            frozenset((n.id, n.bias, n.activation) for n in self.nodes.values()),
+        )
+
+    def add_connection(self, connection: ConnectionGene):
+        """
+        Adds a connection gene to the genome. An existing gene with the same connection is replaced.
+
+        Args:
+            connection (ConnectionGene): The connection gene to add.
+        """
+        old = self.connections.get(connection.connection)
+        if old is None:
+            self.connections_list.append(connection)
+        else:
+            self.connections_list[self.connections_list.index(old)] = connection
+        self.connections[connection.connection] = connection
+        self._connection_arrays = None
+
+    def remove_connection(self, connection: tuple):
+        """
+        Removes a connection gene from the genome.
+
+        Args:
+            connection (tuple): The connection identifier (input node ID, output node ID).
+        """
+        self.connections_list.remove(self.connections.pop(connection))
+        self._connection_arrays = None
+
+    def add_node(self, node: NodeGene):
+        """
+        Adds a node gene to the genome. An existing gene with the same id is replaced.
+
+        Args:
+            node (NodeGene): The node gene to add.
+        """
+        self.nodes[node.id] = node
+        self._node_arrays = None
+        self._node_keys = None
 
     def get_new_node_id(self):
         """
         Generates a new unique node ID for the genome.
 
         Returns:
-            int: A new node ID that is greater than the current maximum node ID.
+            int: A new node ID that is greater than all node IDs handed out so far.
         """
-        return max(self.nodes.keys()) + 1
+        new_id = self._next_node_id
+        self._next_node_id += 1
+        return new_id
 
-    def creates_cycle(self, connections: list, test: tuple):
+    def creates_cycle(self, connections, test: tuple):
         """
         NOTE: This function is from Code Reclaimers 'neat-python' repository and adjusted to fit the current code.
         Refer to: https://github.com/CodeReclaimers/neat-python
         Checks if adding a new connection would create a cycle in the network.
 
         Args:
-            connections (list of tuple): A list of existing connections, where each connection is a tuple (input_node_id, output_node_id).
+            connections (iterable of tuple): The existing connections (e.g. the keys of Genome.connections), where each connection is a tuple (input_node_id, output_node_id).
             test (tuple): The new connection to test, represented as a tuple (input_node_id, output_node_id).
 
         Returns:
@@ -168,16 +379,20 @@ class Genome:
         if i == o:
             return True
 
-        visited = {o}
-        while True:
-            num_added = 0
-            for a, b in connections:
-                if a in visited and b not in visited:
-                    if b == i:
-                        return True
+        # walk the network forwards from o, the connection closes a cycle if i can be reached
+        adjacency = defaultdict(list)
+        for a, b in connections:
+            adjacency[a].append(b)
 
+        visited = {o}
+        stack = [o]
+        while stack:
+            node = stack.pop()
+            for b in adjacency[node]:
+                if b == i:
+                    return True
+                if b not in visited:
                     visited.add(b)
-                    num_added += 1
+                    stack.append(b)
 
-            if num_added == 0:
-                return False
+        return False
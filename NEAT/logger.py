@@ -29,38 +29,14 @@ class Logger:
         print("| spec | #mem | avg fit | best fit | best shape |")
         print("|------|------|---------|----------|------------|")
         for s in species:
-            line = "| "
-            line += str(s.id)
-            for _ in range(7 - len(line)):
-                line += " "
-            line += "| "
-            line += str(len(s))
-            for _ in range(14 - len(line)):
-                line += " "
-            line += "| "
-            line += str(np.round(s.average_fitness, decimals=1))
-            for _ in range(24 - len(line)):
-                line += " "
-            line += "| "
-            line += str(np.round(max([m.fitness for m in s.members]), decimals=1))
-            for _ in range(35 - len(line)):
-                line += " "
-            line += "| "
-            species_winner = max(s.members, key=lambda m: m.fitness)
+            species_winner = s.best_member
             shape = (
                 len(species_winner.nodes),
-                len(
-                    [
-                        c.connection
-                        for c in species_winner.connections.values()
-                        if c.enabled
-                    ]
-                ),
+                sum(1 for c in species_winner.connections.values() if c.enabled),
+            )
+            print(
+                f"| {s.id:<5}| {len(s):<5}| {s.average_fitness:<8.1f}"
+                f"| {species_winner.fitness:<9.1f}| {shape!s:<11}|"
             )
-            line += str(shape)
-            for _ in range(48 - len(line)):
-                line += " "
-            line += "|"
-            print(line)
 
         print("'------'------'---------'----------'------------'\n")
@@ -1,6 +1,6 @@
 import random
 
-from NEAT.genome import ConnectionGene, Genome, NodeGene, NodeType
+from NEAT.genome import ConnectionGene, Genome, NodeGene, NodeType, _rng
 
 
 class Mutation:
@@ -47,21 +47,26 @@ class Mutation:
         Args:
             genome (Genome): The genome to be mutated.
         """
-        # mutate every other genome
-        for node in genome.nodes.keys():
+        # the fitness has to be calculated again
+        genome.invalidate()
+        # draw the probabilities for all nodes and connections at once
+        node_r = _rng.random((len(genome.nodes), 2))
+        conn_r = _rng.random((len(genome.connections), 2))
+
+        for i, node in enumerate(genome.nodes):
             # mutate bias
-            if random.random() < self.mutate_bias_prob:
+            if node_r[i, 0] < self.mutate_bias_prob:
                 self._mutate_bias(genome, node)
             # change bias to a new value
-            elif random.random() < self.change_bias_prob:
+            elif node_r[i, 1] < self.change_bias_prob:
                 self._change_bias(genome, node)
 
-        for connection in genome.connections.keys():
+        for i, connection in enumerate(genome.connections):
             # mutate weight
-            if random.random() < self.mutate_weight_prob:
+            if conn_r[i, 0] < self.mutate_weight_prob:
                 self._mutate_weight(genome, connection)
             # change weight to a new value
-            elif random.random() < self.change_weight_prob:
+            elif conn_r[i, 1] < self.change_weight_prob:
                 self._change_weight(genome, connection)
         # add node
         if random.random() < self.add_node_prob:
@@ -70,6 +75,17 @@ class Mutation:
         if random.random() < self.add_connection_prob:
             self._add_connection(genome)
 
+    def mutate_population(self, genomes: list[Genome], elitist_ids: set[int]):
+        """
+        Applies mutation operations to all genomes of a population, except for the elites.
+        Args:
+            genomes (list[Genome]): The genomes to be mutated.
+            elitist_ids (set[int]): The id() of the genomes to be left unchanged.
+        """
+        for genome in genomes:
+            if id(genome) not in elitist_ids:
+                self.mutate(genome)
+
     def _add_node(self, genome: Genome):
         """
         Adds a new node to the genome by splitting an existing connection.
@@ -79,14 +95,14 @@ class Mutation:
         if len(genome.connections) == 0:
             return
         # picking random connection to be split
-        connection = random.choice(list(genome.connections.values()))
+        connection = random.choice(genome.connections_list)
         connection.enabled = False
         # adding a node
         new_node_id = genome.get_new_node_id()
         new_node = NodeGene(
             new_node_id, NodeType.HIDDEN, random.uniform(-1, 1), "sigmoid"
         )
-        genome.nodes[new_node_id] = new_node
+        genome.add_node(new_node)
         # connection to and from the node
         in_connection_id = (connection.connection[0], new_node_id)
         in_connection = ConnectionGene(
@@ -101,8 +117,8 @@ class Mutation:
             True,
         )
 
-        genome.connections[in_connection_id] = in_connection
-        genome.connections[out_connection_id] = out_connection
+        genome.add_connection(in_connection)
+        genome.add_connection(out_connection)
 
     def _add_connection(self, genome: Genome):
         """
@@ -110,8 +126,9 @@ class Mutation:
         Args:
             genome (Genome): The genome to which a new connection will be added.
         """
-        node1 = random.choice(list(genome.nodes.values()))
-        node2 = random.choice(list(genome.nodes.values()))
+        nodes = list(genome.nodes.values())
+        node1 = random.choice(nodes)
+        node2 = random.choice(nodes)
         # check if these two are valid
         if node1.type == NodeType.SENSOR and node2.type == NodeType.SENSOR:
             return
@@ -121,9 +138,7 @@ class Mutation:
             node1, node2 = node2, node1
         if node1.type != NodeType.SENSOR and node2.type == NodeType.SENSOR:
             return
-        if genome.creates_cycle(
-            [c.connection for c in genome.connections.values()], (node1.id, node2.id)
-        ):
+        if genome.creates_cycle(genome.connections, (node1.id, node2.id)):
             return
         if (
             node2.id < 0
@@ -131,14 +146,14 @@ class Mutation:
             or node2.id in genome.input_node_ids
         ):
             return
-        if (node1.id, node2.id) in genome.connections.keys():
+        if (node1.id, node2.id) in genome.connections:
             genome.connections[(node1.id, node2.id)].enabled = True
 
         new_connection_id = (node1.id, node2.id)
         new_connection = ConnectionGene(
             new_connection_id, node1.id, node2.id, random.uniform(-2, 2), True
         )
-        genome.connections[new_connection_id] = new_connection
+        genome.add_connection(new_connection)
 
     def _change_weight(self, genome: Genome, connection: tuple):
         """
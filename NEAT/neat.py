@@ -1,9 +1,42 @@
+import math
+import os
 import random
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from multiprocessing import get_context
+from operator import attrgetter
 
+import numpy as np
+
+from NEAT.distance_kernel import assign_species, pack_genomes
 from NEAT.genome import Genome
 from NEAT.logger import Logger
 from NEAT.species import *
 
+# speciate compares genomes with the representatives closest by fingerprint first,
+# if there are more than SPECIES_INDEX_MIN species
+SPECIES_INDEX_MIN = 32
+SPECIES_CANDIDATES = 5
+
+
+def _breed(crossover, mutation, parent1: Genome, parent2: Genome) -> Genome:
+    """
+    Creates a child of two parents by crossover and mutation.
+    Defined on module level so it can be sent to the worker processes.
+
+    Args:
+        crossover (Crossover): The crossover strategy.
+        mutation (Mutation): The mutation strategy.
+        parent1 (Genome): The first parent genome.
+        parent2 (Genome): The second parent genome.
+
+    Returns:
+        Genome: The mutated child.
+    """
+    child = crossover.crossover(parent1, parent2)
+    mutation.mutate(child)
+    return child
+
 
 class NEAT:
     """
@@ -18,6 +51,7 @@ class NEAT:
         species_id_counter (int): Counter to assign unique IDs to species.
         distance_threshold (float): The threshold for determining if two genomes belong to the same species.
         pop_size (int): The size of the population.
+        parallel (bool): Whether to calculate fitness, breed offspring and speciate in parallel.
     """
 
     def __init__(
@@ -35,6 +69,8 @@ class NEAT:
             crossover (Crossover): The crossover strategy.
             mutation (Mutation): The mutation strategy.
             distance_threshold (float, optional): The threshold for species differentiation. Defaults to 3.0.
+            parallel (bool, optional): Whether to calculate fitness, breed offspring and speciate in parallel.
+                Speciation only runs in parallel if numba is installed. Defaults to False.
         """
         self.winner = None
         self.selection = selection
@@ -45,6 +81,48 @@ class NEAT:
         self.species_id_counter = 0  # to keep track of species ids
         self.distance_threshold = distance_threshold
         self.parallel = parallel
+        self._pool = None  # worker processes for breeding, created on first use
+        self._thread_pool = None  # worker threads for speciation, created on first use
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        """
+        Returns the process pool used for breeding. The pool is created once and reused
+        for all generations.
+
+        Returns:
+            ProcessPoolExecutor: The process pool.
+        """
+        if self._pool is None:
+            # spawn instead of fork, the process already runs threads of the other pools
+            self._pool = ProcessPoolExecutor(
+                max_workers=os.cpu_count(), mp_context=get_context("spawn")
+            )
+        return self._pool
+
+    def _get_thread_pool(self) -> ThreadPoolExecutor:
+        """
+        Returns the thread pool used for speciation. The pool is created once and reused
+        for all generations.
+
+        Returns:
+            ThreadPoolExecutor: The thread pool.
+        """
+        if self._thread_pool is None:
+            self._thread_pool = ThreadPoolExecutor(max_workers=os.cpu_count())
+        return self._thread_pool
+
+    def close(self):
+        """
+        Shuts down the workers used for breeding and speciation and, if it has any, those of the selection.
+        """
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+        if self._thread_pool is not None:
+            self._thread_pool.shutdown()
+            self._thread_pool = None
+        if hasattr(self.selection, "close"):
+            self.selection.close()
 
     def speciate(self):
         """
@@ -58,34 +136,120 @@ class NEAT:
         # clear previous species but keep a random representative
         for species in self.species:
             species.representative = random.choice(species.members)
-            species.members.clear()
+            species.clear()
+
+        # find the matching species among the existing ones, their representatives are fixed now
+        n_existing = len(self.species)
+        candidates = self._species_candidates()
+        if self.parallel and assign_species is not None and n_existing > 0:
+            matches = self._match_species_parallel(candidates)
+        else:
+            matches = [
+                self._match_species(genome, genome_candidates, n_existing)
+                for genome, genome_candidates in zip(self.population, candidates.tolist())
+            ]
 
-        for genome in self.population:
-            # check if genome fits into an existing species
+        for genome, i in zip(self.population, matches):
+            if i >= 0:
+                self.species[i].add_member(genome)
+                continue
+            # check if genome fits into one of the species created in this generation
             placed = False
-            for species in self.species:
+            for species in self.species[n_existing:]:
                 if (
                     genetic_distance(genome, species.representative)
                     < self.distance_threshold
                 ):
-                    species.members.append(genome)
+                    species.add_member(genome)
                     placed = True
                     break
             # if no suitable species is found, create a new one
             if not placed:
                 self.species_id_counter += 1
                 new_species = Species(self.species_id_counter)
-                new_species.members.append(genome)
+                new_species.add_member(genome)
                 new_species.representative = genome
                 self.species.append(new_species)
         # remove empty species
-        for species in self.species[:]:
-            if len(species) == 0:
-                self.species.remove(species)
+        self.species = [species for species in self.species if species.members]
         # set adjusted fitness for each genome
         for species in self.species:
-            for genome in species.members:
-                genome.adjusted_fitness = genome.fitness / len(species)
+            species.adjust_fitness()
+
+    def _species_candidates(self):
+        """
+        Returns the species each genome is compared with first. If there are more than SPECIES_INDEX_MIN
+        species, these are the SPECIES_CANDIDATES species whose representatives have the closest
+        fingerprints, ordered by fingerprint distance. Otherwise there are no candidates.
+
+        Returns:
+            np.ndarray: The species indices, of shape (len(population), k).
+        """
+        if len(self.species) <= SPECIES_INDEX_MIN:
+            return np.empty((len(self.population), 0), dtype=np.int64)
+
+        index = np.array([fingerprint(species.representative) for species in self.species])
+        fingerprints = np.array([fingerprint(genome) for genome in self.population])
+        d = np.square(fingerprints[:, None, :] - index[None, :, :]).sum(axis=2)
+        closest = np.argpartition(d, SPECIES_CANDIDATES, axis=1)[:, :SPECIES_CANDIDATES]
+        order = np.argsort(np.take_along_axis(d, closest, axis=1), axis=1)
+        return np.take_along_axis(closest, order, axis=1).astype(np.int64)
+
+    def _match_species(self, genome: Genome, candidates: list, n_species: int) -> int:
+        """
+        Finds the first of the first n_species species whose representative is close enough to the genome.
+        The candidates are compared first.
+
+        Args:
+            genome (Genome): The genome.
+            candidates (list): Indices of the species to compare first.
+            n_species (int): The number of species to compare with.
+
+        Returns:
+            int: The index of the matching species, or -1 if there is none.
+        """
+        for i in candidates:
+            if (
+                genetic_distance(genome, self.species[i].representative)
+                < self.distance_threshold
+            ):
+                return i
+        for i in range(n_species):
+            if i in candidates:
+                continue
+            if (
+                genetic_distance(genome, self.species[i].representative)
+                < self.distance_threshold
+            ):
+                return i
+        return -1
+
+    def _match_species_parallel(self, candidates: np.ndarray) -> list:
+        """
+        Same as calling _match_species() for the whole population with all current species, but
+        with the compiled kernel running on chunks of the population in worker threads.
+
+        Args:
+            candidates (np.ndarray): The candidates of each genome, see _species_candidates().
+
+        Returns:
+            list: The index of the matching species of each genome, or -1 if there is none.
+        """
+        genomes = pack_genomes(self.population)
+        representatives = pack_genomes([species.representative for species in self.species])
+        matches = np.empty(len(self.population), dtype=np.int64)
+
+        def match_chunk(bounds):
+            assign_species(
+                *genomes, *representatives, candidates, bounds[0], bounds[1],
+                self.distance_threshold, 1.0, 1.0, 1.0, matches,
+            )
+
+        n_workers = os.cpu_count() or 1
+        bounds = np.linspace(0, len(self.population), n_workers + 1).astype(int).tolist()
+        # consume the results, so exceptions of the workers are raised here
+        list(self._get_thread_pool().map(match_chunk, zip(bounds[:-1], bounds[1:])))
+        return matches.tolist()
 
     def reproduce(self):
         """
@@ -97,45 +261,60 @@ class NEAT:
         - Populates the next generation with selected genomes and offspring.
         """
         self.population.clear()
+        # lowest adjusted fitness and the total of each species, in one pass over the species
+        min_adjusted_fitness = math.inf
+        totals = []
+        for species in self.species:
+            min_adjusted_fitness = min(min_adjusted_fitness, species.min_adjusted_fitness)
+            totals.append(species.total_adjusted_fitness)
         # apply a shift in fitness to avoid negative values. This is required for the species sizes.
-        fitness_shift = (
-            min(m.adjusted_fitness for species in self.species for m in species.members)
-            - 1
-        )
-        total_adjusted_fitness = sum(
-            species.total_adjusted_fitness - fitness_shift * len(species)
-            for species in self.species
-        )
+        fitness_shift = min_adjusted_fitness - 1
+        shifted_fitness = [
+            total - fitness_shift * len(species)
+            for total, species in zip(totals, self.species)
+        ]
+        total_adjusted_fitness = sum(shifted_fitness)
 
         # calculate the breeding size for each species
-        breed_sizes = []
-        for species in self.species:
-            breed_size = round(
-                (
-                    (species.total_adjusted_fitness - fitness_shift * len(species))
-                    / total_adjusted_fitness
-                )
-                * self.pop_size
-            )
-            breed_sizes.append(breed_size)
+        breed_sizes = [
+            round((species_fitness / total_adjusted_fitness) * self.pop_size)
+            for species_fitness in shifted_fitness
+        ]
 
+        parents1 = []
+        parents2 = []
         for species, breed_size in zip(self.species, breed_sizes):
             # selection
             selected = self.selection.select(species.members, self.parallel)
 
-            for i in range(breed_size):
-                if i < len((selected)):
-                    self.population.append(selected[i])
-                else:
-                    # pick two random representatives
-                    parent1 = random.choice(selected)
-                    parent2 = random.choice(selected)
-                    # crossover
-                    child = self.crossover.crossover(parent1, parent2)
-                    # mutation
-                    self.mutation.mutate(child)
-                    # add child to population
-                    self.population.append(child)
+            # the elites are carried over, the rest of the species is bred
+            n_selected = min(breed_size, len(selected))
+            self.population.extend(selected[:n_selected])
+            n_children = breed_size - n_selected
+            if n_children > 0:
+                # pick two random representatives for each child
+                parents = random.choices(selected, k=2 * n_children)
+                parents1.extend(parents[0::2])
+                parents2.extend(parents[1::2])
+
+        # crossover and mutation
+        if self.parallel and parents1:
+            breed = partial(_breed, self.crossover, self.mutation)
+            n_workers = os.cpu_count() or 1
+            children = self._get_pool().map(
+                breed,
+                parents1,
+                parents2,
+                chunksize=max(1, len(parents1) // (4 * n_workers)),
+            )
+            # add children to population
+            self.population.extend(children)
+        else:
+            elitist_ids = {id(genome) for genome in self.population}
+            # add children to population
+            self.population.extend(map(self.crossover.crossover, parents1, parents2))
+            # the elites are carried over unchanged
+            self.mutation.mutate_population(self.population, elitist_ids)
 
     def start(
         self,
@@ -165,31 +344,34 @@ class NEAT:
             self.population.append(
                 Genome(genome_shape[0], genome_shape[1], initial_connections)
             )
-        # calculate fitness values for the first time
-        self.selection.select(self.population, self.parallel)
-
-        for g in range(generations):
-            # create species
-            self.speciate()
-            # calculate best fitness
-            self.winner = self.population[0]
-            for genome in self.population:
-                if genome.fitness > self.winner.fitness:
-                    self.winner = genome
-
-            # check if threshold is reached
-            if threshold is not None:
-                if self.winner.fitness >= threshold:
-                    # log final progress
-                    Logger.log(g + 1, self.winner, self.species)
-                    break
+        # the worker pools are shut down even if a generation raises or is interrupted
+        try:
+            # calculate fitness values for the first time
+            self.selection.select(self.population, self.parallel)
+
+            for g in range(generations):
+                # create species
+                self.speciate()
+                # calculate best fitness, every genome is a member of exactly one species
+                self.winner = max(
+                    (species.best_member for species in self.species),
+                    key=attrgetter("fitness"),
+                )
 
-            # print the current state
-            Logger.log(g + 1, self.winner, self.species)
-            # callback function
-            if callback != None:
-                callback()
-            self.reproduce()
+                # check if threshold is reached
+                if threshold is not None:
+                    if self.winner.fitness >= threshold:
+                        # log final progress
+                        Logger.log(g + 1, self.winner, self.species)
+                        break
 
+                # print the current state
+                Logger.log(g + 1, self.winner, self.species)
+                # callback function
+                if callback != None:
+                    callback()
+                self.reproduce()
+        finally:
+            self.close()
         print("Done!")
         return self.winner
@@ -1,8 +1,17 @@
+import heapq
+import sys
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from math import ceil
-from multiprocessing import Pool, cpu_count
+from operator import attrgetter
+from multiprocessing import cpu_count, get_context
 
 from NEAT.genome import Genome
 
+# without the GIL (free-threaded builds of python 3.13+) the fitness is calculated in threads,
+# which saves sending the genomes to worker processes
+FREE_THREADING = getattr(sys, "_is_gil_enabled", lambda: True)() is False
+
 
 class EliteSelection:
     """
@@ -12,18 +21,75 @@ class EliteSelection:
     Attributes:
         fitness_function (callable): A function that calculates the fitness of a genome.
         elite_ratio (float): The ratio of elites to select from the population. Default is 0.05.
+        deterministic_fitness (bool): Whether the fitness function always returns the same value for the
+            same genome. Only then unchanged genomes are skipped and fitness values are cached. Default is False.
+        cache_capacity (int): The number of fitness values kept in the cache. Default is 0.
+        initializer (callable): A function called once in every worker before calculating fitness in parallel.
     """
 
-    def __init__(self, fitness_function: callable, elite_ratio: float = None):
+    def __init__(
+        self,
+        fitness_function: callable,
+        elite_ratio: float = None,
+        deterministic_fitness: bool = False,
+        cache_capacity: int = 0,
+        initializer: callable = None,
+    ):
         """
         Initializes the EliteSelection class with a fitness function.
 
         Args:
             fitness_function (callable): A function that takes a genome as input and returns its fitness value.
             elite_ratio (float, optional): The ratio of elites to select from the population. Defaults to 0.05.
+            deterministic_fitness (bool, optional): Whether the fitness function always returns the same value
+                for the same genome. If set, genomes which did not change keep their fitness and the fitness of
+                changed genomes is looked up in the cache. Leave it unset for fitness functions playing randomly
+                reset episodes, so every member is scored again in each selection. Defaults to False.
+            cache_capacity (int, optional): The number of fitness values kept in the cache, the least recently
+                used values are dropped first. Only used with deterministic_fitness. Set to 0 to disable
+                the cache. Defaults to 0.
+            initializer (callable, optional): A function without arguments called once in every worker,
+                for example to create an environment. It has to be picklable. Defaults to None.
         """
         self.fitness_function = fitness_function
         self.elite_ratio = elite_ratio if elite_ratio is not None else 0.05
+        self.deterministic_fitness = deterministic_fitness
+        self.cache_capacity = cache_capacity
+        self.initializer = initializer
+        self._cache = OrderedDict()  # structural key of a genome -> fitness
+        self._pool = None  # worker processes for the fitness, created on first use
+
+    def _get_pool(self):
+        """
+        Returns the pool used to calculate the fitness in parallel. The pool is created
+        once and reused for all generations.
+
+        Returns:
+            multiprocessing.pool.Pool | ThreadPoolExecutor: The process pool, or a thread pool
+                if the interpreter runs without the GIL.
+        """
+        if self._pool is None:
+            self._n_workers = cpu_count() - 1 or 1
+            if FREE_THREADING:
+                self._pool = ThreadPoolExecutor(
+                    max_workers=self._n_workers, initializer=self.initializer
+                )
+            else:
+                self._pool = get_context("spawn").Pool(
+                    processes=self._n_workers, initializer=self.initializer
+                )
+        return self._pool
+
+    def close(self):
+        """
+        Shuts down the workers used to calculate the fitness.
+        """
+        if isinstance(self._pool, ThreadPoolExecutor):
+            self._pool.shutdown()
+        elif self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+        self._pool = None
 
     def select(self, population: list[Genome], parallel: bool = False):
         """
@@ -42,26 +108,51 @@ class EliteSelection:
         if n_elites >= len(population):
             return population
 
-        if parallel:
-            # calculating fitness in parallel
-            pool = Pool(processes=cpu_count() - 1 or 1)
-            jobs = []
+        # with a deterministic fitness, genomes which did not change keep their fitness and the others
+        # are looked up in the cache. Of identical genomes only the first one is evaluated.
+        to_evaluate = []
+        keys = []
+        duplicates = {}  # structural key -> genomes identical to the evaluated one
+        use_cache = self.deterministic_fitness and self.cache_capacity > 0
+        for genome in population:
+            if self.deterministic_fitness and not genome.dirty:
+                continue
+            key = genome.structural_key()
+            if use_cache and key in self._cache:
+                genome.fitness = self._cache[key]
+                genome.dirty = False
+                self._cache.move_to_end(key)
+            elif key in duplicates:
+                duplicates[key].append(genome)
+            else:
+                to_evaluate.append(genome)
+                keys.append(key)
+                duplicates[key] = []
 
-            for genome in population:
-                jobs.append(pool.apply_async(self.fitness_function, (genome,)))
-
-            for genome, job in zip(population, jobs):
-                genome.fitness = job.get(timeout=None)
-
-            pool.close()
-            pool.join()
-            pool.terminate()
+        if parallel and to_evaluate:
+            # calculating fitness in parallel, worker processes receive the genomes in chunks
+            pool = self._get_pool()
+            fitnesses = pool.map(
+                self.fitness_function,
+                to_evaluate,
+                chunksize=max(1, len(to_evaluate) // (self._n_workers + 2)),
+            )
+            for genome, fitness in zip(to_evaluate, fitnesses):
+                genome.fitness = fitness
         else:
             # calculating fitness in serial
-            for genome in population:
+            for genome in to_evaluate:
                 genome.fitness = self.fitness_function(genome)
 
-        sorted_population = sorted(
-            population, key=lambda genome: genome.fitness, reverse=True
-        )
-        return sorted_population[:n_elites]
+        for genome, key in zip(to_evaluate, keys):
+            genome.dirty = False
+            for duplicate in duplicates[key]:
+                duplicate.fitness = genome.fitness
+                duplicate.dirty = False
+            if use_cache:
+                self._cache[key] = genome.fitness
+                self._cache.move_to_end(key)
+                if len(self._cache) > self.cache_capacity:
+                    self._cache.popitem(last=False)
+
+        return heapq.nlargest(n_elites, population, key=attrgetter("fitness"))
@@ -1,4 +1,5 @@
 import numpy as np
+from NEAT.distance_kernel import distance_core
 from NEAT.genome import Genome
 
 
@@ -11,6 +12,12 @@ class Species:
         id (int): The unique identifier for the species.
         members (list): A list of members (individuals) belonging to the species.
         representative: The representative genome of the species, used for comparison.
+        best_member: The member with the highest fitness, or None if there are no members.
+
+    Note:
+        Members should be added with add_member() and removed with clear(), which keep the
+        fitness arrays up to date. The arrays hold the fitness values of the members at the
+        time they were added, in the order of the members.
     """
 
     def __init__(self, id: int):
@@ -22,6 +29,44 @@ class Species:
         self.id = id
         self.members = []
         self.representative = None
+        self.best_member = None
+        # fitness and adjusted fitness of the members, only the first len(members) values are used
+        self._fitness = np.empty(8, dtype=np.float64)
+        self._adjusted_fitness = np.empty(8, dtype=np.float64)
+
+    def add_member(self, genome: Genome):
+        """
+        Adds a genome to the members of the species.
+        Args:
+            genome (Genome): The genome to add.
+        """
+        n = len(self.members)
+        if n == len(self._fitness):
+            # double the capacity of the arrays
+            self._fitness = np.concatenate((self._fitness, np.empty(n)))
+            self._adjusted_fitness = np.concatenate((self._adjusted_fitness, np.empty(n)))
+        self._fitness[n] = genome.fitness
+        self._adjusted_fitness[n] = genome.adjusted_fitness
+        self.members.append(genome)
+        if self.best_member is None or genome.fitness > self.best_member.fitness:
+            self.best_member = genome
+
+    def clear(self):
+        """
+        Removes all members from the species. The representative is kept.
+        """
+        self.members.clear()
+        self.best_member = None
+
+    def adjust_fitness(self):
+        """
+        Sets the adjusted fitness of each member to its fitness divided by the size of the species.
+        """
+        n = len(self.members)
+        adjusted_fitness = self._adjusted_fitness[:n]
+        np.divide(self._fitness[:n], n, out=adjusted_fitness)
+        for genome, value in zip(self.members, adjusted_fitness.tolist()):
+            genome.adjusted_fitness = value
 
     @property
     def average_fitness(self):
@@ -31,11 +76,8 @@ class Species:
         Returns:
             float: The average fitness of the members, or negative infinity if there are no members.
         """
-        return (
-            np.mean([member.fitness for member in self.members])
-            if len(self.members) > 0
-            else -float("inf")
-        )
+        n = len(self.members)
+        return float(self._fitness[:n].sum()) / n if n > 0 else -float("inf")
 
     @property
     def average_adjusted_fitness(self):
@@ -45,11 +87,8 @@ class Species:
         Returns:
             float: The average adjusted fitness of the members, or negative infinity if there are no members.
         """
-        return (
-            np.mean([member.adjusted_fitness for member in self.members])
-            if len(self.members) > 0
-            else -float("inf")
-        )
+        n = len(self.members)
+        return self.total_adjusted_fitness / n if n > 0 else -float("inf")
 
     @property
     def total_adjusted_fitness(self):
@@ -59,11 +98,18 @@ class Species:
         Returns:
             float: The sum of the adjusted fitness values of all members, or 0.0 if there are no members.
         """
-        return (
-            sum(member.adjusted_fitness for member in self.members)
-            if len(self.members) > 0
-            else 0.0
-        )
+        return float(self._adjusted_fitness[: len(self.members)].sum())
+
+    @property
+    def min_adjusted_fitness(self):
+        """
+        Returns the lowest adjusted fitness of the members in the species.
+
+        Returns:
+            float: The lowest adjusted fitness of the members, or positive infinity if there are no members.
+        """
+        n = len(self.members)
+        return float(self._adjusted_fitness[:n].min()) if n > 0 else float("inf")
 
     def __len__(self):
         """
@@ -75,6 +121,22 @@ class Species:
         return len(self.members)
 
 
+def fingerprint(genome: Genome):
+    """
+    Returns a cheap low dimensional summary of a genome. Genomes with a small genetic
+    distance have close fingerprints, so it can be used to find likely species before
+    calculating the full genetic distance.
+
+    Args:
+        genome (Genome): The genome.
+
+    Returns:
+        tuple: (number of connections, number of nodes, sum of the connection weights).
+    """
+    _, weights = genome.connection_arrays()
+    return (len(weights), len(genome.nodes), float(weights.sum()))
+
+
 def genetic_distance(
     genome1: Genome, genome2: Genome, c1: float = 1.0, c2: float = 1.0, c3: float = 1.0
 ):
@@ -94,44 +156,51 @@ def genetic_distance(
     """
     #c1 = len(genome1.input_node_ids) * len(genome1.output_node_ids)
     # get the genes.
-    genes1 = set(genome1.connections.keys())
-    genes2 = set(genome2.connections.keys())
+    ids1, weights1 = genome1.connection_arrays()
+    ids2, weights2 = genome2.connection_arrays()
+
+    if distance_core is not None:
+        # compiled version of the computation below
+        node_ids1, activations1 = genome1.node_arrays()
+        node_ids2, activations2 = genome2.node_arrays()
+        return distance_core(
+            ids1, weights1, ids2, weights2,
+            activations1, activations2, node_ids1, node_ids2,
+            c1, c2, c3,
+        )
 
-    # find the disjoint genes.
-    disjoint_genes = genes1 ^ genes2
-    # find the common genes.
-    common_genes = genes1 & genes2
-    n_common_genes = len(common_genes) if len(common_genes) > 0 else 1
+    # find the common genes by looking up the sorted ids of genome1 in those of genome2,
+    # all other genes are disjoint.
+    if len(ids1) > 0 and len(ids2) > 0:
+        idx2 = np.searchsorted(ids2, ids1)
+        np.minimum(idx2, len(ids2) - 1, out=idx2)
+        common = ids2[idx2] == ids1
+        n_common = np.count_nonzero(common)
+        weight_diff = np.abs(weights1[common] - weights2[idx2[common]]).sum()
+    else:
+        n_common = 0
+        weight_diff = 0.0
+    n_disjoint_genes = len(ids1) + len(ids2) - 2 * n_common
+    n_common_genes = n_common if n_common > 0 else 1
 
     # compute the average weight differences of matching genes.
-    avg_weight_diff = (
-        sum(
-            abs(
-                genome1.connections[conn_id].weight
-                - genome2.connections[conn_id].weight
-            )
-            for conn_id in common_genes
-        )
-        / n_common_genes
-    )
+    avg_weight_diff = weight_diff / n_common_genes
 
     # counting different activations
     uncommon_activations = 0
-    n_genes1 = set(genome1.nodes.keys())
-    n_genes2 = set(genome2.nodes.keys())
-    common_n_genes = n_genes1 & n_genes2
+    common_n_genes = genome1.node_keys & genome2.node_keys
     for node in common_n_genes:
         if genome1.nodes[node].activation != genome2.nodes[node].activation:
             uncommon_activations += 1
 
     # normalizing factor for genome size
-    N = max(len(genes1), len(genes2))
+    N = max(len(ids1), len(ids2))
     N = N if N > 0 else 1
     #N = 1 if N < (len(genome1.input_node_ids) * len(genome1.output_node_ids)) * 1.2 else N
 
     # compute the genetic distance
     distance = (
-        ((c1 * len(disjoint_genes)) / N)
+        ((c1 * n_disjoint_genes) / N)
         + (c2 * uncommon_activations / len(common_n_genes))
         + (c3 * avg_weight_diff)
     )
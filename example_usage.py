@@ -23,9 +23,13 @@ INITIAL_CONNS = 16
 
 import my_fitness_function
 
-selection = EliteSelection(my_fitness_function.fitness_function)
-crossover = Crossover()
-mutation = Mutation()
+# the guard is required for the worker processes when running in parallel
+if __name__ == "__main__":
+    selection = EliteSelection(
+        my_fitness_function.fitness_function, initializer=my_fitness_function.get_env
+    )
+    crossover = Crossover()
+    mutation = Mutation()
 
-neat = NEAT(selection, crossover, mutation, distance_threshold=2.0)
-winner = neat.start(POP_SIZE, (N_INPUTS, N_OUPUTS), 100000, THRESHOLD, INITIAL_CONNS)
+    neat = NEAT(selection, crossover, mutation, distance_threshold=2.0)
+    winner = neat.start(POP_SIZE, (N_INPUTS, N_OUPUTS), 100000, THRESHOLD, INITIAL_CONNS)
@@ -1,12 +1,34 @@
+import threading
+from statistics import fmean
+
 import gymnasium as gym
-import numpy as np
+from NEAT.envs import cartpole_numba
 from NEAT.ffnn import FeedForwardNetwork
 
+ENV = "BipedalWalker-v3"  # "CartPole-v1" "LunarLander-v3" "BipedalWalker-v3"
+
+# environments are not thread safe, so every thread (and worker process) creates its own
+_local = threading.local()
+
+
+def get_env():
+    """
+    Returns the environment of the current thread, it is created on the first call.
+    Can be passed as initializer to EliteSelection to create it when a worker starts.
+    """
+    if getattr(_local, "env", None) is None:
+        _local.env = gym.make(ENV)
+    return _local.env
+
 
 # Implement your custom fitness function here
 def fitness_function(genome):
     network = FeedForwardNetwork.create(genome)
-    env = gym.make("BipedalWalker-v3")  # "LunarLander-v3" "BipedalWalker-v3"
+    if ENV.startswith("CartPole"):
+        # simulated without gymnasium, see NEAT/envs/cartpole_numba.py
+        return cartpole_numba.rollout(network, 5)
+
+    env = get_env()
     rewards = []
 
     for i in range(5):
@@ -24,5 +46,4 @@ def fitness_function(genome):
             if done:
                 env.reset()
 
-    env.close()
-    return np.mean(rewards)
+    return fmean(rewards)